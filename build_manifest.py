@@ -0,0 +1,18 @@
+"""
+生成 `routers/` (和 test mode 下的 `tests/`) 的 router manifest, 启动时将直接导入 manifest 内的 routers 而不再扫描目录
+新增或删除 router 后请重新运行, 或删除 `__manifest__.py` 以恢复扫描
+"""
+from importlib import import_module
+
+MODULE_NAME = 'module_name'
+
+if __name__ == '__main__':
+    app_module = import_module(f'{MODULE_NAME}.app')
+
+    target_dirs = [app_module.ROUTERS_DIR]
+    if app_module.config.app.test_mode:
+        target_dirs.append(app_module.TEST_ROUTERS_DIR)
+
+    for target_dir in target_dirs:
+        manifest_path = app_module.create_router_manifest(target_dir)
+        app_module.logger.success('router manifest `{}` generated', manifest_path)
@@ -1,6 +1,10 @@
+import os
+import sys
 from os import PathLike
 from pathlib import Path
+from typing import Iterable, Iterator
 from importlib import import_module
+from importlib.util import resolve_name
 from fastapi import FastAPI, APIRouter
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -16,59 +20,136 @@ from .handles.exception_handles import add_http_exception_handler, add_server_ex
 current_dir = Path(__file__).absolute().resolve().parent
 
 
-def _path2import_path(relative_path: Path) -> str:
+def _path2import_path(relative_path: str) -> str:
     """
-    convert relative path to Python relative import path format
+    convert relative path (without suffix) to Python relative import path format
 
     TIP:
     filename or directory name which includes `.` is not supported because of Python import path format
     """
-    _path = '.'.join(part if part != '..' else '.' for part in relative_path.parts)
+    _path = '.'.join(part if part != '..' else '.' for part in relative_path.split(os.sep))
     return '.' + _path if not _path.startswith('..') else _path
 
 
-def _load_routers(target_dir: str | PathLike, target_router: APIRouter, *, ignore_py_special: bool = False):
-    target_dir = Path(target_dir)
+def _import_module(module_name: str):
+    # 已导入过的模块直接从 sys.modules 取出, 跳过 import 机制
+    return sys.modules.get(resolve_name(module_name, current_dir.name)) or import_module(module_name, current_dir.name)
+
+
+def _iter_routers(target_dir: str | PathLike, *, ignore_py_special: bool = False) -> Iterator[tuple[str, APIRouter]]:
+    """
+    scan `target_dir` (top level only), import each py file and yield `(module_name, router)`
+    for the modules which export an `APIRouter` named `ROUTER_KEYNAME`
+    """
+    # os.scandir 的 DirEntry 自带目录读取时的 stat 结果, 无需为每个文件再 stat
+    with os.scandir(target_dir) as entries:
+        for _entry in entries:  # 仅遍历顶层
+            if not _entry.is_file(follow_symlinks=False):
+                continue
+
+            _name = _entry.name
+            if not _name.endswith('.py'):
+                continue
 
-    for _file in target_dir.iterdir():  # 仅遍历顶层
-        if not _file.is_file():
-            continue
+            _stem = _name[:-3]
+            if _stem == ROUTER_MANIFEST_NAME:
+                continue
 
-        if not _file.suffix.lower().endswith('.py'):
-            continue
+            if ignore_py_special and _stem.startswith('__') and _stem.endswith('__'):
+                continue
 
-        if ignore_py_special and _file.stem.startswith('__') and _file.stem.endswith('__'):
-            continue
+            if '.' in _stem:
+                logger.warning(
+                    'invalid py file name `{}` because `.` is in the file stem, skip to import',
+                    _name
+                )
+                continue
 
-        if '.' in _file.stem:
-            logger.warning(
-                'invalid py file name `{}` because `.` is in the file stem, skip to import',
-                _file.name
-            )
-            continue
+            # slice `[:-3]` to remove suffix `.py`
+            _module_name = _path2import_path(os.path.relpath(_entry.path, current_dir)[:-3])
+            _router = _import_module(_module_name).__dict__.get(ROUTER_KEYNAME)
+            if not isinstance(_router, APIRouter):
+                continue
 
-        # use `Path.with_suffix('')` to remove suffix
-        _module_name = _path2import_path(_file.with_suffix('').relative_to(current_dir))
-        _module = import_module(_module_name, current_dir.name)
-        _router = getattr(_module, ROUTER_KEYNAME, None)
-        if not isinstance(_router, APIRouter):
-            del _module, _module_name, _router
-            continue
+            yield _module_name, _router
 
+
+def _load_manifest(target_dir: str | PathLike) -> Iterable[tuple[str, APIRouter]] | None:
+    """
+    load the routers from the manifest generated by `create_router_manifest`, `None` if there is no manifest
+    """
+    manifest_path = os.path.join(target_dir, ROUTER_MANIFEST_NAME + '.py')
+    if not os.path.isfile(manifest_path):
+        return None
+
+    _module = _import_module(_path2import_path(os.path.relpath(manifest_path, current_dir)[:-3]))
+    return _module.__dict__[ROUTER_MANIFEST_KEYNAME]
+
+
+def _load_routers(target_dir: str | PathLike, target_router: APIRouter, *, ignore_py_special: bool = False):
+    routers = _load_manifest(target_dir)
+    if routers is None:  # 没有 manifest 时扫描目录
+        routers = _iter_routers(target_dir, ignore_py_special=ignore_py_special)
+    else:
+        logger.debug('using router manifest of `{}`', target_dir)
+
+    for _module_name, _router in routers:
         target_router.include_router(_router)
         logger.success('router `{}:{}` added', _module_name, ROUTER_KEYNAME)
-        del _module, _module_name, _router
+
+
+def create_router_manifest(target_dir: str | PathLike, *, ignore_py_special: bool = False) -> Path:
+    """
+    scan `target_dir` once and write a static manifest which imports its routers directly,
+    `_load_routers` will use the manifest instead of scanning the directory if it exists
+
+    NOTE:
+    please run it again (or remove the manifest) after routers are added or removed
+    """
+    lines = [
+        '# generated by `create_router_manifest`, do not edit',
+        f'# re-generate it after routers are added or removed, or remove it to scan `{Path(target_dir).name}/` again',
+    ]
+    routers = []
+    for index, (_module_name, _router) in enumerate(_iter_routers(target_dir, ignore_py_special=ignore_py_special)):
+        lines.append(f'from .{_module_name.rsplit(".", 1)[-1]} import {ROUTER_KEYNAME} as _router_{index}')
+        routers.append(f'    ({_module_name!r}, _router_{index}),')
+
+    lines.extend(('', f'{ROUTER_MANIFEST_KEYNAME} = (', *routers, ')', ''))
+
+    manifest_path = Path(target_dir) / (ROUTER_MANIFEST_NAME + '.py')
+    manifest_path.write_text('\n'.join(lines), encoding='u8')
+    return manifest_path
 
 
 ROUTER_KEYNAME = 'router'
 ROUTER_ROOT_PATH = ''  # root
+ROUTER_MANIFEST_NAME = '__manifest__'
+ROUTER_MANIFEST_KEYNAME = 'ROUTERS'
 
 replace_swagger_ui()
 replace_uvicorn_logger(logger)
-app = FastAPI(**config.app.model_dump())
+app = FastAPI(
+    title=config.app.title,
+    summary=config.app.summary,
+    description=config.app.description,
+    version=config.app.version,
+    docs_url=config.app.docs_url,
+    redoc_url=config.app.redoc_url,
+    root_path=config.app.root_path,
+    # FastAPI 接受 dict 形式的 contact 和 license_info
+    contact=config.app.contact and config.app.contact.model_dump(),
+    license_info=config.app.license_info and config.app.license_info.model_dump(),
+)
 app.add_middleware(
     CORSMiddleware,  # type: ignore
-    **config.cors.model_dump()
+    allow_origins=config.cors.allow_origins,
+    allow_methods=config.cors.allow_methods,
+    allow_headers=config.cors.allow_headers,
+    allow_credentials=config.cors.allow_credentials,
+    allow_origin_regex=config.cors.allow_origin_regex,
+    expose_headers=config.cors.expose_headers,
+    max_age=config.cors.max_age,
 )
 
 if config.service.rate_limit.enable:
@@ -79,12 +160,15 @@ add_request_validation_exception_handler(app)
 add_exception_handler_middleware(app)
 root_router = APIRouter(prefix=ROUTER_ROOT_PATH)
 
+ROUTERS_DIR = current_dir / 'routers/'
+TEST_ROUTERS_DIR = current_dir / 'tests/'
+
 logger.info('start to load routers...')
-_load_routers(current_dir / 'routers/', root_router)
+_load_routers(ROUTERS_DIR, root_router)
 logger.success('routers are loaded')
 if config.app.test_mode:
     logger.debug('test mode is enabled, loading test routers...')
-    _load_routers(current_dir / 'tests/', root_router)
+    _load_routers(TEST_ROUTERS_DIR, root_router)
     logger.debug('test routers are loaded')
 app.include_router(root_router)
 
@@ -93,13 +177,15 @@ from .commit_hash import COMMIT_HASH
 logger.success('app startup completed, current commit hash `{}`', COMMIT_HASH)
 
 
-@app.get('/')
-async def index():
-    current_file_url = Path(__file__).absolute().resolve().as_uri()
-
-    return HTMLResponse(f'''
+# 页面内容不随请求变化, 仅在导入时生成一次
+_INDEX_HTML = f'''
     <h1>Hello World!</h1>
     <p>if you can see this page, it means your server is working now!</p>
     <p>click <a href="https://github.com/Lovemilk-Team/fastapi-template/blob/main/module_name/config.py">here</a> to see the tutorial</p>
-    <p>notes: your can find this HTML in the function `index` of `<a href="{current_file_url}" _target="_blank">app.py</a>`</p>
-    '''.strip())
+    <p>notes: your can find this HTML in the constant `_INDEX_HTML` of `<a href="{(current_dir / 'app.py').as_uri()}" _target="_blank">app.py</a>`</p>
+    '''.strip().encode('u8')
+
+
+@app.get('/')
+async def index():
+    return HTMLResponse(_INDEX_HTML)
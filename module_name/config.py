@@ -1,3 +1,4 @@
+import os
 import yaml
 from pathlib import Path
 from http import HTTPStatus
@@ -11,10 +12,10 @@ from .structs.rate_limiter import MatchFields, MatchMethod
 
 try:
     # LibYAML is much faster
-    from yaml import Cloader as Loader, CDumper as Dumper
+    from yaml import CSafeLoader as Loader, CSafeDumper as Dumper
 except ImportError:
     # fallback: default implement based on Python
-    from yaml import Loader, Dumper
+    from yaml import SafeLoader as Loader, SafeDumper as Dumper
 
 APP_VERSION = '0.1.0'
 MERGED_CONFIG_PATH = './merged.config.yml'
@@ -33,7 +34,18 @@ class AppConfig(BaseModel):
     host: str = '127.0.0.1'
     port: int | str = 8000
     reload: bool = False
+    workers: int | None = Field(
+        default=1,
+        description='the number of worker processes (`None` to use the number of CPUs), ignored when reload is True. '
+                    'NOTE: each worker has its own rate limit records'
+    )
     proxy_headers: bool = True
+    loop: str = Field(
+        default='auto', description='the event loop of uvicorn, `auto` uses uvloop if installed (not for Windows)'
+    )
+    http: str = Field(
+        default='auto', description='the HTTP protocol implementation of uvicorn, `auto` uses httptools if installed'
+    )
     test_mode: bool = Field(
         default=False,
         description='use test mode, if it was True, the routers in `<module-name>/tests/` will be included to app'
@@ -163,20 +175,28 @@ class Config(BaseModel):
 
 def _load_yaml(path: str | Path) -> dict[str, Any]:
     path = Path(path)
-    if not path.exists() or not path.is_file():
-        return {}
-
     try:
-        with path.open('r', encoding='u8') as fp:
+        with path.open('rb') as fp:  # 由 YAML 加载器自行解码 (默认 UTF-8)
             loaded = yaml.load(fp, Loader=Loader)
             return loaded if isinstance(loaded, dict) else {}
-    except (FileNotFoundError, PermissionError):
+    except (FileNotFoundError, IsADirectoryError, PermissionError):
         return {}
 
 
 _ReturnType = TypeVar('_ReturnType')
 
 
+def _list_files(directory: str | Path) -> set[str]:
+    """
+    list the names of the files in `directory` (not recursive), empty set if it cannot be read
+    """
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries if entry.is_file()}
+    except OSError:
+        return set()
+
+
 def _map_files(
         filenames: str | Iterable[str | Path], suffixes: str | Iterable[str], callback: Callable[[Path], _ReturnType]
 ) -> list[_ReturnType]:
@@ -185,13 +205,19 @@ def _map_files(
     filenames = (filenames,) if isinstance(filenames, str) else filenames
     suffixes = (suffixes,) if isinstance(suffixes, str) else suffixes
 
+    # 每个目录仅 scandir 一次, 之后在内存中判断文件是否存在
+    directory_files: dict[Path, set[str]] = {}
     for filename in filenames:
-        path = Path(filename + suffixes[0])  # 避免后缀被吞
+        path = Path(filename)
+        directory = path.parent
+        if directory not in directory_files:
+            directory_files[directory] = _list_files(directory)
+
         for suffix in suffixes:
-            path_with_suffix = path.with_suffix(suffix)
-            if not path_with_suffix.is_file():
+            name_with_suffix = path.name + suffix  # 直接拼接, 避免 `with_suffix` 吞掉 `prod.config` 等中的 `.config`
+            if name_with_suffix not in directory_files[directory]:
                 continue
-            result.append(callback(path_with_suffix))
+            result.append(callback(directory / name_with_suffix))
 
     return result
 
@@ -225,7 +251,7 @@ def load_config() -> Config:
     _is_dev = getenv('MILK_DEVMODE', '').strip() == '1'
     config_dict: dict = {}
     for config in _map_files(
-            ('config', 'prod.config') + ('dev.config',) if _is_dev else (),
+            ('config', 'prod.config') + (('dev.config',) if _is_dev else ()),
             ('.json', '.yaml', '.yml'),
             _load_yaml
     ):
@@ -234,5 +260,5 @@ def load_config() -> Config:
 
     config = Config(**config_dict)
     if not _is_dev:
-        create_config(config)
+        create_config(config, force_write=False)  # 已有生成文件时不再重复 dump 与写入
     return config
@@ -1,7 +1,9 @@
+from hashlib import blake2b
 from fastapi import Depends
 from typing import Sequence, Annotated, Callable
 from fastapi.params import Depends as DependsParam
-from sqlalchemy import Engine, Table, MetaData, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import Engine, Table, MetaData, Column, String, inspect, text, select, delete, insert
 from functools import partial
 from sqlmodel import create_engine, SQLModel, Table, Session
 
@@ -16,54 +18,91 @@ __all__ = (
 )
 
 
+# 记录上次同步的表结构 hash, 不放在 SQLModel.metadata 中以免被 create_all 和 hash 计算包含
+_schema_meta = Table('_schema_meta', MetaData(), Column('hash', String(32), primary_key=True))
+
+
+def _get_schema_hash(tables: Sequence[Table] | None = None) -> str:
+    schema = sorted(
+        (table.name, tuple((column.name, repr(column.type)) for column in table.columns))
+        for table in SQLModel.metadata.tables.values()
+    )
+    created = None if tables is None else sorted(table.name for table in tables)
+    return blake2b(repr((schema, created)).encode('u8'), digest_size=16).hexdigest()
+
+
+def _is_schema_synced(engine: Engine, schema_hash: str) -> bool:
+    try:
+        with engine.connect() as connection:
+            return connection.execute(
+                select(_schema_meta.c.hash).where(_schema_meta.c.hash == schema_hash)
+            ).first() is not None
+    except SQLAlchemyError:  # 首次运行时 `_schema_meta` 表不存在
+        return False
+
+
+def _save_schema_hash(engine: Engine, schema_hash: str):
+    with engine.begin() as connection:
+        _schema_meta.create(connection, checkfirst=True)
+        connection.execute(delete(_schema_meta))
+        connection.execute(insert(_schema_meta).values(hash=schema_hash))
+
+
 def _get_table(table_name: str, metadata: MetaData, engine: Engine) -> Table:
     return Table(table_name, metadata, autoload_with=engine)
 
 
-def _get_tables(metadata: MetaData, engine: Engine) -> dict[str, Table]:
-    return {
-        table_name: _get_table(table_name, metadata, engine) for table_name in inspect(engine).get_table_names()
-    }
+# 支持在一条 `ALTER TABLE` 中添加多个 column 的数据库
+_MULTI_ADD_COLUMN_DIALECTS = ('mysql', 'mariadb', 'postgresql')
 
 
 def _merge_table(old: Table, new: Table, engine: Engine):
     old_columns = old.columns
+    added_columns = [column for column in new.columns if column.name not in old_columns]  # type: ignore
+    if not added_columns:
+        return
 
-    with engine.connect() as connection:
-        for column in new.columns:  # type: ignore
-            column_name = column.name
-            if column_name in old_columns:
-                continue
+    if engine.dialect.name in _MULTI_ADD_COLUMN_DIALECTS:
+        statements = [', '.join(f'ADD COLUMN {column.name} {column.type}' for column in added_columns)]
+    else:
+        statements = [f'ADD COLUMN {column.name} {column.type}' for column in added_columns]
 
-            connection.execute(  # 手动添加 column
-                text(f'ALTER TABLE {new.name} ADD COLUMN {column.name} {column.type}')
-            )
-            db_logger.success(
-                'update database structure succeed for table `{}`: added column `{}`, type `{}`',
-                new.name, column.name, column.type
-            )
+    with engine.begin() as connection:
+        for statement in statements:  # 手动添加 column
+            connection.execute(text(f'ALTER TABLE {new.name} {statement}'))
+
+    for column in added_columns:
+        db_logger.success(
+            'update database structure succeed for table `{}`: added column `{}`, type `{}`',
+            new.name, column.name, column.type
+        )
 
 
 def _merge_tables(engine: Engine, metadata: MetaData | None = None):
     metadata = metadata or MetaData()
-    old_tables = _get_tables(metadata, engine)
+    existing_tables = set(inspect(engine).get_table_names())
     for table_name, table in SQLModel.metadata.tables.items():
-        if table_name not in old_tables:
+        if table_name not in existing_tables:
             continue
 
-        old_table = old_tables[table_name]
+        # 仅反射 SQLModel.metadata 中定义了的表
+        old_table = _get_table(table_name, metadata, engine)
         _merge_table(old_table, table, engine)
 
 
-def connect2database(tables: Sequence[Table] | None = None, checkfirst: bool = True) -> Engine:
+def connect2database(
+        tables: Sequence[Table] | None = None, checkfirst: bool = True, use_schema_hash: bool = True
+) -> Engine:
     """
     connect to database
 
     :param tables: the tables will be created (if not exists), `None` to create all
     :param checkfirst: (from `SQLModel.metadata.create_all`) Defaults to True, don't issue CREATEs for tables already present in the target database.
+    :param use_schema_hash: skip creating and merging tables if the hash of models is the same as the one saved in database last time
 
     NOTE:
     please import SQL models first to let model be added to `SQLModel.metadata`
+    if the tables are changed outside (like dropped manually), please drop `_schema_meta` or set `use_schema_hash` to False
     """
     if not config.service.database.enable:
         raise RuntimeError('database is not enabled')
@@ -73,8 +112,15 @@ def connect2database(tables: Sequence[Table] | None = None, checkfirst: bool = T
         **config.service.database.extras
     )
 
+    schema_hash = _get_schema_hash(tables)
+    if use_schema_hash and _is_schema_synced(engine, schema_hash):
+        db_logger.debug('database structure is not changed (hash `{}`), skip to create and merge tables', schema_hash)
+        return engine
+
     SQLModel.metadata.create_all(engine, tables=tables, checkfirst=checkfirst)
     _merge_tables(engine)  # 合并 columns
+    if use_schema_hash:
+        _save_schema_hash(engine, schema_hash)
     return engine
 
 
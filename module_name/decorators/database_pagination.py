@@ -1,13 +1,14 @@
 from sqlmodel import Session
+from functools import lru_cache
 from sqlalchemy import Select
 from pydantic import BaseModel
-from asyncio import iscoroutine
-from fastapi.responses import Response
-from typing import Sequence, Callable, Any
+from pydantic_core import to_json
+from fastapi.responses import Response, StreamingResponse
+from typing import Sequence, Callable, Any, Iterator, Collection
 from fastapi.exceptions import HTTPException
-from inspect import signature, Parameter, Signature
+from inspect import signature, iscoroutinefunction, isawaitable, Parameter, Signature
 
-from ..database import dbsession_depend
+from ..database import dbsession_depend, engine
 from ..structs.responses import BaseResponse
 
 __all__ = (
@@ -17,6 +18,10 @@ __all__ = (
     'use_limit_pagination'
 )
 
+# `inspect.signature` 需要解析 `__wrapped__`, 默认值等, 同一被装饰函数的签名只计算一次
+# NOTE: 仅用于被装饰的函数, 其 `__signature__` 不会被修改; handler 的签名会被 `_merge_func_sign` 覆盖, 不可缓存
+_signature: Callable[[Callable[..., Any]], Signature] = lru_cache(maxsize=None)(signature)
+
 
 def _get_merged_func_sign(
         func: Callable[..., Any],
@@ -24,6 +29,7 @@ def _get_merged_func_sign(
         return_annotation: Any = ...,
         skip_VAR_POSITIONAL: bool = True,
         skip_VAR_KEYWORD: bool = True,
+        exclude: Collection[str] = (),
 ) -> tuple[Signature, dict[str, Any]]:
     _is_VAR_POSITIONAL: Callable[[Parameter], bool] = lambda param: param.kind == Parameter.VAR_POSITIONAL
     _is_VAR_KEYWORD: Callable[[Parameter], bool] = lambda param: param.kind == Parameter.VAR_KEYWORD
@@ -31,10 +37,12 @@ def _get_merged_func_sign(
     params = []
     annotations = {}
     func_sign = signature(func)
-    for sign in (*map(signature, functions), func_sign):
+    for sign in (*map(_signature, functions), func_sign):
         for param in sign.parameters.values():
             if skip_VAR_POSITIONAL and _is_VAR_POSITIONAL(param) or skip_VAR_KEYWORD and _is_VAR_KEYWORD(param):
                 continue
+            if param.name in exclude:
+                continue
 
             params.append(param)
             annotations[param.name] = param.annotation
@@ -42,16 +50,46 @@ def _get_merged_func_sign(
     return Signature(params, return_annotation=return_annotation), annotations
 
 
-def _merge_func_sign(func: Callable[..., Any], origin_func: Callable[..., Any], return_annotation: Any = ...):
+# 由 BaseResponse 渲染得到 `{"code":200,"message":"OK","data":[]}`, 去掉末尾的 `]}` 作为流式响应的开头
+# 与 `BaseResponse.render` 使用同一份 phrase 与序列化, 保证两者的格式一致
+_STREAM_PREFIX: bytes = BaseResponse(code=200, data=[]).body[:-2]
+
+
+def _stream_rows(statement: Select, yield_per: int) -> Iterator[bytes]:
+    """
+    execute `statement` and yield the rows as JSON in the format of `BaseResponseModel` chunk by chunk
+
+    NOTE:
+    the session is created here because the session of the dependency may be closed before the response is sent
+    """
+    yield _STREAM_PREFIX
+
+    with Session(engine) as session:
+        result = session.exec(statement.execution_options(yield_per=yield_per))
+        first = True
+        for rows in result.partitions():
+            chunk = b','.join(map(to_json, rows))
+            yield chunk if first else b',' + chunk
+            first = False
+
+    yield b']}'
+
+
+def _merge_func_sign(
+        func: Callable[..., Any],
+        origin_func: Callable[..., Any],
+        return_annotation: Any = ...,
+        exclude: Collection[str] = ()
+):
     """
-    merge the arguments of `func` and `origin_func` exclude `*argv` or `**kwargs`
+    merge the arguments of `func` and `origin_func` exclude `*argv`, `**kwargs` or the names in `exclude`
     and set `func`'s name to `origin_func`'s name
 
     NOTE:
     the signature and annotations of `func` will be updated
     """
     func.__signature__, func.__annotations__ = \
-        _get_merged_func_sign(func, origin_func, return_annotation=return_annotation)
+        _get_merged_func_sign(func, origin_func, return_annotation=return_annotation, exclude=exclude)
     func.__name__ = origin_func.__name__
 
 
@@ -116,7 +154,9 @@ def use_limit_pagination(
         return_annotation: Any | None = None,
         handle_select: bool = False,
         invalid_code: int = 422,
-        invalid_message: str = 'invalid param `{param}`: {msg}'
+        invalid_message: str = 'invalid param `{param}`: {msg}',
+        stream: bool = False,
+        stream_yield_per: int = 500
 ):
     """
     use limit pagination (the pagination which based on limit and offset) for function return value
@@ -127,30 +167,30 @@ def use_limit_pagination(
     :param handle_select: handle return value if it is select statement object or not
     :param invalid_code: the HTTP status code when an invalid parma provided
     :param invalid_message: the message when an invalid parma provided (use `{param}` and `{msg}` stand for the name of param and the message of error)
+    :param stream: stream the rows as JSON chunk by chunk instead of loading all of them (`response_generator` will be ignored)
+    :param stream_yield_per: the count of rows fetched and sent at a time if `stream` is True
+
+    NOTE:
+    if `stream` is True, the rows are queried by a new session of `engine` which is opened while sending the response,
+    the `session` dependency is removed, so `app.dependency_overrides` on `dbsession_depend` do not apply
 
     TIP:
     `@use_limit_pagination` (without call) is equivalent to `@use_limit_pagination()` when no arguments are provided
     """
 
     def _wrapper(_func: Callable):
-        async def _pagination_handler(
-                limit: int | None = None,  # query
-                offset: int | None = None,  # query
-                session: Session = dbsession_depend,
-                *args, **kwargs
-        ) -> Response:
-            response = _func(*args, **kwargs)
-            if iscoroutine(response):
-                response = await response
-
+        def _paginate(response: Any, limit: int | None, offset: int | None, session: Session) -> Response:
             if handle_select and isinstance(response, Select):
                 response = LimitOffsetPage(data=response)  # convert to LimitOffsetPage
 
             if not isinstance(response, LimitOffsetPage):
                 return response
 
-            response.limit = response.limit if response.limit is not None else limit
-            response.offset = response.offset if response.offset is not None else offset
+            # 优先使用被装饰函数返回的值, 仅在其为 None 时使用 query 参数
+            if response.limit is None:
+                response.limit = limit
+            if response.offset is None:
+                response.offset = offset
             try:
                 handled_statement = response.apply_pagination()
             except InvalidParamError as exc:
@@ -158,14 +198,43 @@ def use_limit_pagination(
                     status_code=invalid_code, detail=invalid_message.format(param=exc.param, msg=exc.msg)
                 )
 
+            if stream:
+                return StreamingResponse(
+                    _stream_rows(handled_statement, stream_yield_per), media_type=BaseResponse.media_type
+                )
             return response_generator(session.exec(handled_statement).all())
 
+        # 在装饰时确定 `_func` 是否为协程函数, 避免每次请求都检查返回值是否为 coroutine
+        if iscoroutinefunction(_func):
+            async def _pagination_handler(
+                    limit: int | None = None,  # query
+                    offset: int | None = None,  # query
+                    session: Session = dbsession_depend,
+                    *args, **kwargs
+            ) -> Response:
+                return _paginate(await _func(*args, **kwargs), limit, offset, session)
+        else:
+            async def _pagination_handler(
+                    limit: int | None = None,  # query
+                    offset: int | None = None,  # query
+                    session: Session = dbsession_depend,
+                    *args, **kwargs
+            ) -> Response:
+                response = _func(*args, **kwargs)
+                # 返回 awaitable 但并非协程函数的情况 (例如包装 async 函数的同步 wrapper, 或 `async __call__` 的对象)
+                if isawaitable(response):
+                    response = await response
+
+                return _paginate(response, limit, offset, session)
+
         # 将形参(名称及其类型)和函数签名合并, 并忽略 `*args` 和 `**kwargs`
         # 并使 Docs UI 的名称显示为上级函数名称, 而非始终显示 `Pagination Handler`
         _merge_func_sign(
             _pagination_handler,
             _func,
-            return_annotation=return_annotation if return_annotation is not None else signature(_func).return_annotation
+            return_annotation=return_annotation if return_annotation is not None else _signature(_func).return_annotation,
+            # 流式响应使用自己的 session, 不再依赖注入一个不会被使用的 session
+            exclude=('session',) if stream else ()
         )
 
         return _pagination_handler
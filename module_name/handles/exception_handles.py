@@ -1,7 +1,7 @@
-from functools import partial
-from asyncio import iscoroutine
+from inspect import iscoroutinefunction, isawaitable
 from fastapi import FastAPI, Request
 from fastapi.responses import Response
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
 from typing import Any, Callable, TypeVar, Coroutine, Awaitable, TypeAlias
 from fastapi.exceptions import HTTPException, StarletteHTTPException, RequestValidationError
 
@@ -20,51 +20,100 @@ _ExceptionHandlerType: TypeAlias = Callable[
     [Request, _ExceptionType],
     None | BaseResponse | Response | Awaitable[BaseResponse | Response] | Coroutine[Any, Any, BaseResponse | Response]
 ]
+# (handler, is_async), 在注册时确定 handler 是否为协程函数
 _exception_handlers: dict[
-    _ExceptionType, list[_ExceptionHandlerType]
+    _ExceptionType, list[tuple[_ExceptionHandlerType, bool]]
 ] = {}
+_exception_types: tuple[_ExceptionType, ...] = ()  # 缓存 `_exception_handlers` 的 keys, 在 `_add_handler` 时更新
 
 
-def _get_handlers(exc: _ExceptionType) -> list[_ExceptionHandlerType] | None:
-    return _exception_handlers[exc]
+def _get_handlers(exc: _ExceptionType) -> list[tuple[_ExceptionHandlerType, bool]] | None:
+    # 按 MRO 查找, 使子类 Exception 也能匹配到父类的 handlers
+    for exc_class in exc.__mro__:
+        handlers = _exception_handlers.get(exc_class)
+        if handlers:
+            return handlers
 
+    return None
 
-async def _exception_handler_middleware(handle_all: bool, request: Request, call_next):
-    errored = True
 
-    try:
-        resp = await call_next(request)
-        errored = False
-        return resp
-    except tuple(_exception_handlers.keys()) as exc:  # 相对引入和绝对引入的 Exception 不相等, 请注意!
-        handlers = _get_handlers(type(exc))
-        if not handlers:
-            raise
-
-        for handler in handlers:
+async def _handle_exception(request: Request, exc: Exception) -> BaseResponse | Response | None:
+    """
+    call the handlers of `exc` in order, return the first response or `None` if no handler returned a response
+    """
+    handlers = _get_handlers(type(exc))
+    if not handlers:
+        return None
+
+    for handler, is_async in handlers:
+        if is_async:
+            result = await handler(request, exc)
+        else:
             result = handler(request, exc)
-            if iscoroutine(result):
+            # 返回 awaitable 但并非协程函数的 handler (例如 `async __call__` 的对象)
+            if isawaitable(result):
                 result = await result
 
-            if isinstance(result, (Response, BaseResponse)):
-                errored = False
-                return result
+        if isinstance(result, (Response, BaseResponse)):
+            return result
+
+    return None
+
+
+class _ExceptionHandlerMiddleware:
+    """
+    pure ASGI middleware, avoid the extra task and memory stream per request of `BaseHTTPMiddleware`
+
+    NOTE:
+    the exceptions added by `_add_handler` are handled by their handlers, others are logged here and
+    responded with status code 500 if `handle_all`, otherwise re-raised
+    """
+
+    def __init__(self, app: ASGIApp, handle_all: bool = True) -> None:
+        self.app = app
+        self.handle_all = handle_all
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def _send(message: Message):
+            nonlocal response_started
+            if message['type'] == 'http.response.start':
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        except Exception as exc:
+            response = None
+            # 相对引入和绝对引入的 Exception 不相等, 请注意!
+            if not response_started and isinstance(exc, _exception_types):
+                response = await _handle_exception(Request(scope, receive), exc)
+
+            if response is None:
+                # 直接从 exc 取得 traceback, 不依赖 `sys.exc_info()`
+                logger.opt(exception=exc).error('unhandled exception: {!r}', exc)
+                # 响应已开始发送时无法再替换为其他响应
+                # 在此返回 500 而不交给 Starlette 的 ServerErrorMiddleware, 否则其会再次抛出, 导致 uvicorn 重复记录 traceback
+                if not self.handle_all or response_started:
+                    raise
+
+                response = BaseResponse(code=500)
 
-        logger.exception(exc)
-        raise
-    except Exception as exc:
-        logger.exception(exc)
-        raise
-    finally:
-        if handle_all and errored:
-            return BaseResponse(code=500)
+            await response(scope, receive, send)
 
 
 def _add_handler(exc: _ExceptionType, handler: _ExceptionHandlerType):
+    global _exception_types
     if exc not in _exception_handlers:
         _exception_handlers[exc] = []
+        _exception_types = tuple(_exception_handlers.keys())
 
-    _exception_handlers[exc].append(handler)
+    _exception_handlers[exc].append((handler, iscoroutinefunction(handler)))
 
 
 # 由于 app.exception_handler 无法捕获位于 middleware 的 exception, 此处使用 middleware 实现
@@ -92,7 +141,7 @@ def add_server_exception_handler(app: FastAPI):
     async def _handle_server_exception(_: Request, exc: ServerException) -> BaseResponse:
         return exc.response
 
-    _add_handler(StarletteHTTPException, _handle_server_exception)  # type: ignore
+    _add_handler(ServerException, _handle_server_exception)  # type: ignore
     app.exception_handler(ServerException)(_handle_server_exception)
 
 
@@ -110,4 +159,4 @@ def add_exception_handler_middleware(app: FastAPI, handle_all: bool = True):
     :param app: the FastAPI instance
     :param handle_all: if return a response with status code 500 even the exception happened you haven't added
     """
-    app.middleware('http')(partial(_exception_handler_middleware, handle_all))
+    app.add_middleware(_ExceptionHandlerMiddleware, handle_all=handle_all)  # type: ignore
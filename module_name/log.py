@@ -5,16 +5,20 @@ from .shared import config
 
 logger.remove()
 
-log_config_dict = config.log.model_dump()
-stderr_kwargs = {k[7:]: v for k, v in log_config_dict.items() if k.startswith('stderr_')}
-if not stderr_kwargs['format']:
-    stderr_kwargs.pop('format')
+# 直接读取已校验的 LogConfig 属性, 无需 model_dump
+stderr_kwargs = {'level': config.log.stderr_level}
+if config.log.stderr_format:
+    stderr_kwargs['format'] = config.log.stderr_format
 
 logger.add(sys.stderr, backtrace=False, **stderr_kwargs)
 
-file_kwargs = {k[5:]: v for k, v in log_config_dict.items() if k.startswith('file_')}
-if not file_kwargs['format']:
-    file_kwargs.pop('format')
+file_kwargs = {
+    'level': config.log.file_level,
+    'rotation': config.log.file_rotation,
+    'retention': config.log.file_retention,
+}
+if config.log.file_format:
+    file_kwargs['format'] = config.log.file_format
 
 logger.add(
     'logs/{time:YYYY-MM-DD}.log',
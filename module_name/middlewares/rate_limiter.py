@@ -1,21 +1,26 @@
+from time import monotonic_ns
+from collections import deque
 from fastapi import Request, FastAPI
-from datetime import timedelta, datetime
-from typing import Callable, Any, Sequence
+from datetime import timedelta
+from typing import Callable, Hashable
 from fastapi.exceptions import HTTPException
+from starlette.types import ASGIApp, Scope, Receive, Send
 
 from ..log import logger
 from ..shared import config
-from ..structs.rate_limiter import MatchFields, MatchMethod, RequestState
+from ..structs.rate_limiter import MatchFields, MatchMethod, MATCH_FIELD_IP, MATCH_FIELD_USERAGENT, \
+    MATCH_FIELD_COOKIE, MATCH_FIELD_AUTH, MATCH_METHOD_AND, MATCH_METHOD_OR
 
 __all__ = (
+    'RateLimitMiddleware',
     'add_rate_limit'
 )
 
-_field_mapping: dict[MatchFields, Callable[[Request], Any]] = {
-    MatchFields.IP.value: lambda _req: _req.client.host,
-    MatchFields.USERAGENT.value: lambda _req: _req.headers.get('User-Agent'),
-    MatchFields.COOKIE.value: lambda _req: _req.cookies,
-    MatchFields.AUTH.value: lambda _req: _req.headers.get('Authorization'),
+_field_mapping: dict[MatchFields, Callable[[Request], Hashable]] = {
+    MATCH_FIELD_IP: lambda _req: _req.client.host,
+    MATCH_FIELD_USERAGENT: lambda _req: _req.headers.get('User-Agent'),
+    MATCH_FIELD_COOKIE: lambda _req: frozenset(_req.cookies.items()),  # dict 不可 hash
+    MATCH_FIELD_AUTH: lambda _req: _req.headers.get('Authorization'),
 }
 
 _match_fields: list[MatchFields] = config.service.rate_limit.match_fields
@@ -25,71 +30,101 @@ _limit: int = config.service.rate_limit.limit
 _status_code: int = config.service.rate_limit.status_code
 _message: str | None = config.service.rate_limit.message
 
+rate_limit_logger = logger.bind(name='rate_limiter')
 
-def _map_seq(seq_1: Sequence[Any] | dict, seq_2: Sequence[Any] | dict, *, ignore_empty: bool):
-    return ((ignore_empty and (not item or item not in seq_2)) or item == seq_2[key]
-            for key, item in (seq_1.items() if isinstance(seq_1, dict) else enumerate(seq_1)))
 
+class RateLimitMiddleware:
+    """
+    pure ASGI rate limit middleware, see config `service.rate_limit`
 
-def _and(seq_1: Sequence[Any] | dict, seq_2: Sequence[Any] | dict) -> bool:
-    return all(_map_seq(seq_1, seq_2, ignore_empty=False))
+    NOTE:
+    `HTTPException` will be raised if rate limit exceeded, it should be handled by an outer middleware
+    """
 
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
 
-def _or(seq_1: Sequence[Any] | dict, seq_2: Sequence[Any] | dict) -> bool:
-    return any(_map_seq(seq_1, seq_2, ignore_empty=True))
-
-
-def add_rate_limit(app: FastAPI):
-    if not config.service.rate_limit.enable:
-        raise RuntimeError('rate limit is not enabled')
-
-    rate_limit_datas: list[RequestState] = []
-    rate_limit_logger = logger.bind(name='rate_limiter')
-
-    async def _remove_olds():
-        nonlocal rate_limit_datas
-        _now = datetime.utcnow()
-        for index in range(len(rate_limit_datas) - 1, -1, -1):  # 从后开始找直到第一个超出 _window_time 的请求
-            request_state = rate_limit_datas[index]
-            if _now - request_state.timestamp > _window_time:
-                rate_limit_datas = rate_limit_datas[index + 1:]  # 由于是顺序 appended, 所以可以直接删除前面的
-                rate_limit_logger.debug('removed old requests by index from 0 to {}', index)
-                break
-
-    async def _rate_limit_middleware(request: Request, call_next):
-        nonlocal rate_limit_datas
-        await _remove_olds()  # 先移除掉超出 _window_time 的请求
-
-        _fields = dict(  # 获取各字段
-            filter(
-                lambda _item: _item[1] is not None and _item[1] is not ...,
-                {_field.value: _field_mapping[_field.value](request) for _field in _match_fields}.items()
-            )
+        self._window_ns = _window_time // timedelta(microseconds=1) * 1000
+        # 启动时解析好各字段的 getter, 请求时无需再访问 enum 及 `_field_mapping`
+        self._named_getters: tuple[tuple[str, Callable[[Request], Hashable]], ...] = tuple(
+            (_field, _field_mapping[_field]) for _field in _match_fields
+        )
+        self._getters: tuple[Callable[[Request], Hashable], ...] = tuple(
+            _getter for _, _getter in self._named_getters
         )
-        if _match_method.value == MatchMethod.OR.value:
-            _last_requests = filter(lambda _item: _or(_fields, _item.fields), rate_limit_datas)
-        elif _match_method.value == MatchMethod.AND.value:
-            _last_requests = filter(lambda _item: _and(_fields, _item.fields), rate_limit_datas)
+
+        # 以客户端指纹为 key, 值为该客户端按顺序 appended 的请求时间戳 (monotonic 纳秒)
+        # 中间件内没有 await, 故对 dict 与 deque 的修改在事件循环中是原子的, 无需加锁
+        self._rate_limit_datas: dict[Hashable, deque[int]] = {}
+        self._next_sweep = monotonic_ns() + self._window_ns
+
+        # _match_method 在启动后不再变化, 此处仅判断一次并选出对应的指纹函数
+        self._get_fingerprints: Callable[[Request], list[Hashable]]
+        if _match_method == MATCH_METHOD_AND:  # 所有字段相同才视为同一客户端
+            self._get_fingerprints = self._and_fingerprints
+        elif _match_method == MATCH_METHOD_OR:  # 任一 (非空) 字段相同即视为同一客户端, 各字段单独计数
+            self._get_fingerprints = self._or_fingerprints
         else:
             rate_limit_logger.error('invalid match method `{}`', _match_method)
             assert False, f'invalid match method `{_match_method}`'
 
+    def _and_fingerprints(self, request: Request) -> list[Hashable]:
+        return [tuple([_getter(request) for _getter in self._getters])]
+
+    def _or_fingerprints(self, request: Request) -> list[Hashable]:
+        return [(_name, _value) for _name, _getter in self._named_getters if (_value := _getter(request))]
+
+    def _sweep(self, now: int):
+        # 移除最后一次请求也已超出 _window_time 的客户端, 避免 dict 无限增长
+        _expired = [
+            key for key, timestamps in self._rate_limit_datas.items()
+            if not timestamps or now - timestamps[-1] > self._window_ns  # `limit` 为 0 时 deque 始终为空
+        ]
+        for key in _expired:
+            del self._rate_limit_datas[key]
+
+        if _expired:
+            rate_limit_logger.debug('removed {} expired clients', len(_expired))
+
+    def _check(self, request: Request):
+        _now = monotonic_ns()
+        if _now >= self._next_sweep:
+            self._sweep(_now)
+            self._next_sweep = _now + self._window_ns
+
+        _fingerprints = self._get_fingerprints(request)
         _last_request_count = 0
-        for _ in _last_requests:  # filter 不能用 len
-            _last_request_count += 1
+        for _fingerprint in _fingerprints:
+            _timestamps = self._rate_limit_datas.get(_fingerprint)
+            if _timestamps is None:
+                # 只需知道窗口内是否已有 _limit 次请求, 保留最近 _limit 个时间戳即可, 攻击时开销也不超过 O(_limit)
+                _timestamps = self._rate_limit_datas[_fingerprint] = deque(maxlen=_limit)
 
-        rate_limit_datas.append(
-            RequestState(fields=_fields)  # type: ignore
-        )
+            while _timestamps and _now - _timestamps[0] > self._window_ns:  # 先移除掉超出 _window_time 的请求
+                _timestamps.popleft()
 
-        if _last_request_count > _limit:
+            _last_request_count = max(_last_request_count, len(_timestamps))
+            _timestamps.append(_now)
+
+        if _last_request_count >= _limit:
+            # deque 最多保留 _limit 个时间戳, 无法得知实际请求次数, 仅记录已达到限制
             rate_limit_logger.error(
-                'rate limit exceeded: requested {} times in {} is more than {} time limit,'
+                'rate limit exceeded: reached {} time limit in {},'
                 ' status: {}, detail: {} (for client `{}`)',
-                _last_request_count, _window_time, _limit, _status_code, _message, _fields
+                _limit, _window_time, _status_code, _message, _fingerprints
             )
             raise HTTPException(status_code=_status_code, detail=_message)
-        return await call_next(request)
 
-    app.middleware('http')(_rate_limit_middleware)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'http':
+            self._check(Request(scope))
+
+        await self.app(scope, receive, send)
+
+
+def add_rate_limit(app: FastAPI):
+    if not config.service.rate_limit.enable:
+        raise RuntimeError('rate limit is not enabled')
+
+    app.add_middleware(RateLimitMiddleware)  # type: ignore
     rate_limit_logger.success('rate limiter enabled!')
@@ -1,6 +1,6 @@
 from typing import Any, Mapping
 
-from .responses import BaseResponse
+from .responses import BaseResponse, ErrorResponse
 
 __all__ = (
     'ServerException',
@@ -12,8 +12,16 @@ class ServerException(Exception):
             self, code: int, message: str | None = None, data: Any | None = None, errors: Any | None = None,
             headers: Mapping[str, Any] | None = None
     ) -> None:
-        self._response = BaseResponse(code=code, message=message, data=data, errors=errors, headers=headers)
+        # 仅在需要时 (被转换为响应时) 才创建 BaseResponse
+        self._args = (code, message, data, errors, headers)
+        self._response: BaseResponse | None = None
 
     @property
-    def response(self):
+    def response(self) -> BaseResponse:
+        if self._response is None:
+            code, message, data, errors, headers = self._args
+            if errors is None:
+                self._response = BaseResponse(code=code, message=message, data=data, headers=headers)
+            else:  # BaseResponse 不接受 errors
+                self._response = ErrorResponse(code=code, message=message, data=data, errors=errors, headers=headers)
         return self._response
@@ -1,39 +1,31 @@
-import sys
-from typing import Any
-from datetime import datetime
-from pydantic import Field
-from pydantic.dataclasses import dataclass
+from time import monotonic_ns
+from dataclasses import dataclass, field
+from typing import Any, Final, Literal
 
 __all__ = (
     'MatchFields',
     'MatchMethod',
+    'MATCH_FIELD_IP',
+    'MATCH_FIELD_USERAGENT',
+    'MATCH_FIELD_COOKIE',
+    'MATCH_FIELD_AUTH',
+    'MATCH_METHOD_AND',
+    'MATCH_METHOD_OR',
     'RequestState'
 )
 
-if sys.version_info >= (3, 11):
-    from enum import StrEnum
-else:
-    from enum import Enum
+MATCH_FIELD_IP: Final = 'ip'
+MATCH_FIELD_USERAGENT: Final = 'useragent'
+MATCH_FIELD_COOKIE: Final = 'cookies'
+MATCH_FIELD_AUTH: Final = 'auth'
+MatchFields = Literal['ip', 'useragent', 'cookies', 'auth']
 
-    # 手动创建 StrEnum 类型
-    class StrEnum(str, Enum):
-        pass
-    del Enum
+MATCH_METHOD_AND: Final = 'and'
+MATCH_METHOD_OR: Final = 'or'
+MatchMethod = Literal['and', 'or']
 
 
-class MatchFields(StrEnum):
-    IP = 'ip'
-    USERAGENT = 'useragent'
-    COOKIE = 'cookies'
-    AUTH = 'auth'
-
-
-class MatchMethod(StrEnum):
-    AND = 'and'
-    OR = 'or'
-
-
-@dataclass
+@dataclass(slots=True)
 class RequestState:
     fields: dict[str, Any]
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: int = field(default_factory=monotonic_ns)  # nanoseconds of `time.monotonic_ns()`
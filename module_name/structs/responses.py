@@ -1,45 +1,73 @@
 from http import HTTPStatus
-from typing import Any, TypeVar, Generic
+from pydantic_core import to_json
+from typing import Any, TypeVar, Generic, TypedDict
 from pydantic import BaseModel, Field
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 
 __all__ = (
+    'PydanticResponse',
     'ResponseDataType',
+    'BaseResponseDict',
     'BaseResponseModel',
     'BaseResponse',
     'ResponseErrorType',
+    'ErrorResponseDict',
     'ErrorResponseModel',
     'ErrorResponse',
     'basemodel2response'
 )
 
 
-def basemodel2response(status_code: int, model: BaseModel, *, headers=None) -> JSONResponse:
-    return JSONResponse(
-        status_code=status_code,
-        content=model.model_dump(mode='json'),
-        headers=headers,
-        media_type=JSONResponse.media_type
-    )
+class PydanticResponse(Response):
+    """
+    `Response` which serializes content to JSON bytes by pydantic-core directly in one pass
+    (pydantic models are serialized without dumping them to dict first, and can be nested in dict or list)
+    """
+    media_type = 'application/json'
 
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+
+def basemodel2response(status_code: int, model: BaseModel, *, headers=None) -> PydanticResponse:
+    return PydanticResponse(content=model, status_code=status_code, headers=headers)
+
+
+# HTTPStatus 不会变化, 提前建立 status code 到 phrase 的映射, 避免每次响应都查找 enum
+_PHRASE_CACHE: dict[int, str] = {status.value: status.phrase for status in HTTPStatus}
+# 默认 message 的 JSON 形式 (含引号), 序列化时直接拼接, 无需再次转义
+_PHRASE_JSON: dict[str, bytes] = {phrase: to_json(phrase) for phrase in (*_PHRASE_CACHE.values(), '')}
+_BASE_RESPONSE_KEYS = frozenset(('code', 'message', 'data'))
 
 ResponseDataType = TypeVar('ResponseDataType')
 ResponseErrorType = TypeVar('ResponseErrorType')
 
 
+class BaseResponseDict(TypedDict):
+    """
+    the envelope of `BaseResponse` on the wire, `BaseResponseModel` describes the same shape for OpenAPI
+    """
+    code: int
+    message: str
+    data: Any
+
+
 class BaseResponseModel(BaseModel, Generic[ResponseDataType]):
     code: int
     message: str | None = None
     data: ResponseDataType | None = None
 
     def model_post_init(self, __context: Any) -> None:
-        self.message = HTTPStatus(self.code).phrase if self.message is None else self.message
+        if self.message is None:
+            # 绕过 pydantic 的 `__setattr__`, 直接写入实例
+            object.__setattr__(self, 'message', _PHRASE_CACHE.get(self.code, ''))
 
 
-class BaseResponse(JSONResponse):
+class BaseResponse(PydanticResponse):
     @staticmethod
-    def _get_content(**kwargs) -> BaseResponseModel[ResponseDataType]:
-        return BaseResponseModel(**kwargs)
+    def _get_content(**kwargs) -> BaseResponseDict | BaseResponseModel:
+        # 字段均由 BaseResponse 自身给出, 仅用于序列化, 无需构建 pydantic model
+        return BaseResponseDict(**kwargs)
 
     def __init__(
             self, code: int | BaseResponseModel, message: str | None = None, data: ResponseDataType | None = None,
@@ -53,22 +81,32 @@ class BaseResponse(JSONResponse):
         :param data: the data of response or `None`
         """
         if isinstance(code, BaseResponseModel):
-            _content = basemodel2response(code.code, code, **kwargs)
+            _content = code
+            self.code, self.message, self.data = _content.code, _content.message, _content.data
         else:
             self.code = code
-            self.message = HTTPStatus(self.code).phrase if message is None else message
+            self.message = _PHRASE_CACHE.get(self.code, '') if message is None else message
             self.data = data
 
-            _content = self._get_content(
-                code=self.code, message=self.message, data=self.data
-            ).model_dump(mode='json')
+            _content = self._get_content(code=self.code, message=self.message, data=self.data)
 
-        super().__init__(
-            content=_content,
-            status_code=self.code,
-            media_type=JSONResponse.media_type,
-            **kwargs
-        )
+        super().__init__(content=_content, status_code=self.code, **kwargs)
+
+    def render(self, content: BaseResponseDict | BaseModel) -> bytes:
+        # message 为默认的 HTTP status phrase 时直接拼接预先序列化的结果, 仅序列化 data
+        if type(content) is dict and content.keys() == _BASE_RESPONSE_KEYS:
+            message = content['message']  # 也可能是 list 或 dict (例如 rate limit 的 message)
+            message_json = _PHRASE_JSON.get(message) if type(message) is str else None
+            if message_json is not None:
+                return b'{"code":%d,"message":%s,"data":%s}' % (
+                    content['code'], message_json, to_json(content['data'])
+                )
+
+        return super().render(content)
+
+
+class ErrorResponseDict(BaseResponseDict):
+    errors: Any
 
 
 class ErrorResponseModel(BaseResponseModel, Generic[ResponseDataType, ResponseErrorType]):
@@ -76,8 +114,8 @@ class ErrorResponseModel(BaseResponseModel, Generic[ResponseDataType, ResponseEr
 
 
 class ErrorResponse(BaseResponse):
-    def _get_content(self, **kwargs) -> ErrorResponseModel[ResponseDataType, ResponseErrorType]:
-        return ErrorResponseModel(**kwargs, errors=self.errors)
+    def _get_content(self, **kwargs) -> ErrorResponseDict | ErrorResponseModel:
+        return ErrorResponseDict(**kwargs, errors=self.errors)
 
     def __init__(self, errors: ResponseErrorType | None = None, **kwargs):
         """
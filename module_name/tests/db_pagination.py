@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Response
 from sqlmodel import select, Session, SQLModel, Field
 
 
@@ -17,11 +17,14 @@ class CreateTestModel(BaseModel):
 
 
 from ..database import dbsession_depend
-from ..structs.responses import BaseResponseModel
+from ..structs.responses import BaseResponseModel, basemodel2response
 from ..decorators.database_pagination import use_limit_pagination
 
 router = APIRouter(prefix='/test/pagination')
 
+# Select 是不可变的, 分页时 `.offset().limit()` 会生成新对象, 可在请求间复用
+_SELECT_TEST_MODEL = select(TestModel)
+
 
 @router.get('/', description='test pagination for database')
 # FastAPI 仅支持 pydantic 类型进行泛型标记
@@ -31,15 +34,22 @@ def get_model(
 ):
     assert isinstance(request, Request), 'failed to inject depends'
 
-    return select(TestModel)
+    return _SELECT_TEST_MODEL
+
+
+@router.get('/stream', description='test streaming pagination for database')
+@use_limit_pagination(handle_select=True, return_annotation=BaseResponseModel[list[TestModel]], stream=True)
+def stream_model():
+    return _SELECT_TEST_MODEL
 
 
-@router.post('/', description='add test model to database')
-def add_model(model_params: CreateTestModel, session: Session = dbsession_depend) -> TestModel:
-    db_model = TestModel.model_validate(model_params)
+@router.post('/', description='add test model to database', response_model=TestModel)
+def add_model(model_params: CreateTestModel, session: Session = dbsession_depend) -> Response:
+    db_model = TestModel.model_validate(model_params)  # 仅在写入时校验
 
     session.add(db_model)
     session.commit()
     session.refresh(db_model)
 
-    return db_model
+    # 数据刚由数据库返回, 直接序列化而不再经过 FastAPI 对 response_model 的校验
+    return basemodel2response(200, db_model)
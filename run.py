@@ -1,8 +1,11 @@
+import os
+from importlib import import_module
+
 MODULE_NAME = 'module_name'
 
 # import {MODULE_NAME}.shared
 # config = {MODULE_NAME}.shared.config
-config = __import__(f'{MODULE_NAME}.shared').shared.config
+config = import_module(f'{MODULE_NAME}.shared').config
 
 if __name__ == '__main__':
     from uvicorn import run
@@ -13,5 +16,9 @@ if __name__ == '__main__':
         port=config.app.port,
         reload=config.app.reload,
         reload_dirs=[f'./{MODULE_NAME}'],
+        # reload 时 uvicorn 仅使用单个进程
+        workers=None if config.app.reload else (config.app.workers or os.cpu_count()),
+        loop=config.app.loop,
+        http=config.app.http,
         proxy_headers=config.app.proxy_headers
     )